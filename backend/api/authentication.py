@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import CustomUser
+
+SHARED_KEY = 'auth-token:{}'
+
+
+class TokenCache:
+    """
+    Кеш «ключ токена -> снимок пользователя». По умолчанию это
+    ограниченный LRU в памяти процесса. При TOKEN_CACHE_SHARED снимки
+    хранятся только в общем кеше Django, чтобы выход, смена пароля или
+    деактивация в одном воркере сразу действовали во всех.
+    Снимок - кортеж значений полей CustomUser, кроме пароля.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.fields = [
+            field.attname for field in CustomUser._meta.concrete_fields
+            if field.attname != 'password'
+        ]
+        self.id_index = self.fields.index('id')
+
+    @property
+    def size(self):
+        return getattr(settings, 'TOKEN_CACHE_SIZE', 1024)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'TOKEN_CACHE_TIMEOUT', 10)
+
+    @property
+    def shared(self):
+        # Кеш в памяти процесса не общий: удаление токена в одном воркере
+        # не сбросило бы копии в остальных.
+        return (getattr(settings, 'TOKEN_CACHE_SHARED', False)
+                and not isinstance(caches['default'], LocMemCache))
+
+    def get(self, key):
+        if self.shared:
+            snapshot = cache.get(SHARED_KEY.format(key))
+            return None if snapshot is None else self.to_user(snapshot)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, snapshot = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    return self.to_user(snapshot)
+                del self.entries[key]
+        return None
+
+    def set(self, key, user):
+        snapshot = tuple(getattr(user, field) for field in self.fields)
+        if self.shared:
+            cache.set(SHARED_KEY.format(key), snapshot, self.timeout)
+        else:
+            self.remember(key, snapshot)
+
+    def remember(self, key, snapshot):
+        if not self.size or not self.timeout:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, snapshot)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def to_user(self, snapshot):
+        return CustomUser.from_db('default', self.fields, snapshot)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared:
+            cache.delete_many([SHARED_KEY.format(key) for key in keys])
+
+    def delete_user(self, user_id):
+        """ Сбрасывает все токены пользователя, включая уже удаленные
+        из базы, но оставшиеся в памяти процесса. """
+        with self.lock:
+            keys = {
+                key for key, (_, snapshot) in self.entries.items()
+                if snapshot[self.id_index] == user_id
+            }
+        keys.update(Token.objects.filter(
+            user_id=user_id).values_list('key', flat=True))
+        if keys:
+            self.delete(*keys)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который берет пользователя из token_cache вместо
+    запроса Token + CustomUser. Кеш сбрасывается сигналами при выходе
+    (удалении токена) и при любом сохранении пользователя, в том числе
+    смене пароля и деактивации.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            token = Token(key=key, user=user)
+            token._state.adding = False
+            return user, token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
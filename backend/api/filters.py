@@ -1,7 +1,9 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import (FavoriteRecipes, Ingredient, Recipe,
+                            ShoppingCart, Tag)
 
 
 class IngredientFilter(SearchFilter):
@@ -13,10 +15,16 @@ class IngredientFilter(SearchFilter):
 
 
 class RecipeFilter(FilterSet):
+    """
+    Теги, избранное и корзина проверяются подзапросами EXISTS, а не JOIN:
+    строки рецептов не размножаются, DISTINCT не нужен, а избранное
+    и корзина ищутся по уникальным индексам (user, recipe).
+    """
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(
@@ -27,12 +35,20 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
 
-    def filter_is_favorited(self, queryset, name, value):
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag__in=value)))
+
+    def filter_user_relation(self, queryset, model, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(model.objects.filter(
+                user=self.request.user, recipe_id=OuterRef('pk'))))
         return queryset
 
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_relation(queryset, FavoriteRecipes, value)
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_list__user=self.request.user)
-        return None
+        return self.filter_user_relation(queryset, ShoppingCart, value)
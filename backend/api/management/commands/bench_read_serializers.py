@@ -0,0 +1,79 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import FastJSONRenderer
+from api.representations import (RECIPE_FIELDS, ingredients_representation,
+                                 recipes_representation)
+from api.serializers import IngredientSerializer, RecipeSerializer
+from recipes.models import Ingredient, Recipe
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время CPU на страницу для RecipeSerializer '
+            'и облегченного пути чтения, проверяя совпадение ответов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--user', help='username текущего пользователя')
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        if options['user']:
+            try:
+                request.user = CustomUser.objects.get(
+                    username=options['user'])
+            except CustomUser.DoesNotExist:
+                raise CommandError('Пользователь не найден')
+        size = options['page_size']
+        pages = [
+            (offset, offset + size)
+            for offset in range(0, options['pages'] * size, size)
+        ]
+        if not Recipe.objects.exists():
+            raise CommandError('Нет рецептов для замера')
+
+        def serializer_page(start, stop):
+            request._user_relations = None
+            data = RecipeSerializer(
+                Recipe.objects.all()[start:stop], many=True,
+                context={'request': request}).data
+            return JSONRenderer().render(data)
+
+        def fast_page(start, stop):
+            request._user_relations = None
+            data = recipes_representation(
+                Recipe.objects.values(*RECIPE_FIELDS)[start:stop], request)
+            return FastJSONRenderer().render(data)
+
+        self.compare('recipes', pages, serializer_page, fast_page)
+        self.compare(
+            'ingredients', [(None, None)],
+            lambda *page: JSONRenderer().render(IngredientSerializer(
+                Ingredient.objects.all(), many=True).data),
+            lambda *page: FastJSONRenderer().render(
+                ingredients_representation(Ingredient.objects.all())),
+        )
+
+    def compare(self, name, pages, slow, fast):
+        timings = []
+        for build in (slow, fast):
+            started = time.process_time()
+            outputs = [build(*page) for page in pages]
+            timings.append((time.process_time() - started) / len(pages))
+            if build is slow:
+                expected = outputs
+        if outputs != expected:
+            raise CommandError(f'{name}: ответы не совпадают')
+        slow_ms, fast_ms = (timing * 1000 for timing in timings)
+        self.stdout.write(
+            f'{name}: {slow_ms:.2f} мс -> {fast_ms:.2f} мс CPU на страницу '
+            f'(x{slow_ms / fast_ms if fast_ms else float("inf"):.1f})'
+        )
@@ -0,0 +1,97 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.filters import RecipeFilter
+from recipes.models import FavoriteRecipes, Recipe, ShoppingCart, Tag
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает фильтры списка рецептов через JOIN + DISTINCT '
+            'и через EXISTS для пользователя с большим избранным. '
+            'Тестовые данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--favorites', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def prepare(self, count):
+        user = CustomUser.objects.create_user(
+            username='bench-filters', email='bench-filters@example.com',
+            first_name='bench', last_name='bench', password=None)
+        missing = count - Recipe.objects.filter(is_archived=False).count()
+        if missing > 0:
+            Recipe.objects.bulk_create(
+                Recipe(author=user, name=f'bench {number}', text='bench',
+                       cooking_time=1, image='recipes/bench.png')
+                for number in range(missing)
+            )
+        recipe_ids = list(Recipe.objects.filter(
+            is_archived=False).values_list('id', flat=True)[:count])
+        tags = list(Tag.objects.all()[:2])
+        through = Recipe.tags.through
+        for tag in tags:
+            through.objects.bulk_create(
+                (through(recipe_id=recipe_id, tag=tag)
+                 for recipe_id in recipe_ids),
+                ignore_conflicts=True,
+            )
+        for model in (FavoriteRecipes, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            )
+        return user, [tag.slug for tag in tags]
+
+    def run(self, options):
+        user, slugs = self.prepare(options['favorites'])
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        recipes = Recipe.objects.filter(is_archived=False)
+        cases = [
+            ({'is_favorited': 1}, recipes.filter(favorites__user=user)),
+            ({'is_in_shopping_cart': 1},
+             recipes.filter(shopping_list__user=user)),
+            ({'is_favorited': 1, 'is_in_shopping_cart': 1},
+             recipes.filter(favorites__user=user,
+                            shopping_list__user=user)),
+        ]
+        if slugs:
+            cases.append((
+                {'is_favorited': 1, 'tags': slugs},
+                recipes.filter(favorites__user=user,
+                               tags__slug__in=slugs).distinct(),
+            ))
+        size = options['page_size']
+        order = ('-pub_date', '-id')
+        for params, joined in cases:
+            filtered = RecipeFilter(
+                params, queryset=recipes, request=request).qs
+            results = []
+            timings = []
+            for queryset in (joined, filtered):
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    result = (queryset.count(), list(queryset.order_by(
+                        *order).values_list('id', flat=True)[:size]))
+                timings.append(
+                    (time.perf_counter() - started) / options['repeat'])
+                results.append(result)
+            if results[0] != results[1]:
+                raise CommandError(f'{params}: результаты не совпадают')
+            joined_ms, exists_ms = (timing * 1000 for timing in timings)
+            self.stdout.write(
+                f'{params}: {results[1][0]} рецептов, '
+                f'JOIN {joined_ms:.2f} мс -> EXISTS {exists_ms:.2f} мс '
+                f'на страницу'
+            )
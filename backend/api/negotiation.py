@@ -0,0 +1,12 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class IgnoreClientContentNegotiation(DefaultContentNegotiation):
+    """
+    Для действий, которые сами формируют ответ нужного типа (выгрузки
+    файлом): заголовок Accept не проверяется, а ошибки отдаются первым
+    рендерером представления.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
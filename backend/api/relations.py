@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from recipes.models import FavoriteRecipes, ShoppingCart
+from users.models import Follow
+
+VERSION_KEY = 'user-relations-version:{}'
+DATA_KEY = 'user-relations:{}:{}'
+
+
+class UserRelations:
+    """ Подписки, избранное и корзина пользователя в виде множеств id. """
+
+    def __init__(self, following, favorites, shopping_cart):
+        self.following = following
+        self.favorites = favorites
+        self.shopping_cart = shopping_cart
+
+    @classmethod
+    def load(cls, user):
+        return cls(
+            frozenset(Follow.objects.filter(
+                user=user).values_list('author_id', flat=True)),
+            frozenset(FavoriteRecipes.objects.filter(
+                user=user).values_list('recipe_id', flat=True)),
+            frozenset(ShoppingCart.objects.filter(
+                user=user).values_list('recipe_id', flat=True)),
+        )
+
+    def as_tuple(self):
+        return (tuple(self.following), tuple(self.favorites),
+                tuple(self.shopping_cart))
+
+    @classmethod
+    def from_tuple(cls, data):
+        return cls(*(frozenset(ids) for ids in data))
+
+
+def _cache_timeout():
+    # В кеше в памяти процесса сброс версии в одном воркере не виден
+    # остальным, и они отдавали бы устаревшие флаги до истечения timeout.
+    if isinstance(caches['default'], LocMemCache):
+        return 0
+    return getattr(settings, 'USER_RELATIONS_CACHE_TIMEOUT', 0)
+
+
+def _load(user):
+    timeout = _cache_timeout()
+    if not timeout:
+        return UserRelations.load(user)
+    version = cache.get_or_set(
+        VERSION_KEY.format(user.pk), time.time_ns, None)
+    key = DATA_KEY.format(user.pk, version)
+    data = cache.get(key)
+    if data is not None:
+        return UserRelations.from_tuple(data)
+    relations = UserRelations.load(user)
+    cache.set(key, relations.as_tuple(), timeout)
+    return relations
+
+
+def get_relations(request):
+    """
+    Возвращает связи текущего пользователя, загружая их один раз за запрос.
+    Для анонимного пользователя или без запроса возвращает None.
+    """
+    if request is None or not request.user.is_authenticated:
+        return None
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = _load(request.user)
+        request._user_relations = relations
+    return relations
+
+
+def invalidate_relations(request):
+    """ Сбрасывает закешированные связи после изменения подписок,
+    избранного или корзины. """
+    request._user_relations = None
+    if not _cache_timeout():
+        return
+    key = VERSION_KEY.format(request.user.pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
@@ -0,0 +1,30 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer с одним на процесс компактным энкодером без проверки
+    циклических ссылок. Вывод побайтно совпадает с JSONRenderer.
+    """
+    _encoder = None
+
+    @classmethod
+    def get_encoder(cls):
+        if cls._encoder is None:
+            cls._encoder = cls.encoder_class(
+                ensure_ascii=cls.ensure_ascii,
+                allow_nan=not cls.strict,
+                check_circular=False,
+                separators=(',', ':'),
+            )
+        return cls._encoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (data is None or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = self.get_encoder().encode(data)
+        ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+from recipes.models import IngredientInRecipe, Recipe
+from users.models import CustomUser
+
+from .relations import get_relations
+
+RECIPE_FIELDS = ('id', 'author_id', 'image', 'name', 'text', 'cooking_time')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+def tags_representation(queryset):
+    return list(queryset.values(*TAG_FIELDS))
+
+
+def ingredients_representation(queryset):
+    return list(queryset.values(*INGREDIENT_FIELDS))
+
+
+def recipe_row(recipe):
+    """ Строка рецепта в том же виде, что и из .values(*RECIPE_FIELDS). """
+    return {
+        'id': recipe.id,
+        'author_id': recipe.author_id,
+        'image': recipe.image.name,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def image_url(name, request):
+    if not name:
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def recipes_representation(rows, request):
+    """
+    Собирает ответ RecipeSerializer для страницы рецептов из строк
+    .values(*RECIPE_FIELDS): ингредиенты, теги и авторы загружаются
+    тремя запросами на всю страницу, без объектов полей DRF.
+    """
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    relations = get_relations(request)
+
+    ingredients = defaultdict(list)
+    for recipe_id, *values in IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ):
+        ingredients[recipe_id].append(dict(zip(
+            ('id', 'name', 'measurement_unit', 'amount'), values
+        )))
+
+    tags = defaultdict(list)
+    for recipe_id, *values in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id', *('tag__' + field for field in TAG_FIELDS)
+    ):
+        tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+
+    authors = {}
+    for values in CustomUser.objects.filter(
+        id__in={row['author_id'] for row in rows}
+    ).values_list(*AUTHOR_FIELDS):
+        author = dict(zip(AUTHOR_FIELDS, values))
+        author['is_subscribed'] = (
+            relations is not None and author['id'] in relations.following
+        )
+        authors[author['id']] = author
+
+    return [
+        {
+            'id': row['id'],
+            'ingredients': ingredients[row['id']],
+            'tags': tags[row['id']],
+            'image': image_url(row['image'], request),
+            'author': authors[row['author_id']],
+            'is_in_shopping_cart': (
+                relations is not None and row['id'] in relations.shopping_cart
+            ),
+            'is_favorited': (
+                relations is not None and row['id'] in relations.favorites
+            ),
+            'name': row['name'],
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+        for row in rows
+    ]
+
+
+def ingredient_row(ingredient):
+    return {field: getattr(ingredient, field) for field in INGREDIENT_FIELDS}
+
+
+def tag_row(tag):
+    return {field: getattr(tag, field) for field in TAG_FIELDS}
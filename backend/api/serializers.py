@@ -1,13 +1,17 @@
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
 from rest_framework.generics import get_object_or_404
+from recipes import shopping_list
 from recipes.models import (FavoriteRecipes, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
 from users.models import CustomUser
 
+from .relations import get_relations
+
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -47,6 +51,23 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+class UserSerializer(UserSerializer):
+    is_subscribed = SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = ('email', 'id', 'username', 'first_name',
+                  'last_name',
+                  'is_subscribed',
+                  )
+
+    def get_is_subscribed(self, obj):
+        relations = get_relations(self.context.get('request'))
+        if relations is None:
+            return False
+        return obj.id in relations.following
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(read_only=False, many=True)
@@ -65,16 +86,16 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'name', 'text', 'cooking_time')
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        relations = get_relations(self.context.get('request'))
+        if relations is None:
             return False
-        return obj.shopping_list.filter(user=request.user).exists()
+        return obj.id in relations.shopping_cart
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        relations = get_relations(self.context.get('request'))
+        if relations is None:
             return False
-        return obj.favorites.filter(user=request.user).exists()
+        return obj.id in relations.favorites
 
     def get_ingredients(self, obj):
         ingredients = IngredientInRecipe.objects.filter(recipe=obj)
@@ -96,6 +117,19 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         return data
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount',)
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -111,23 +145,6 @@ class FavoriteSerializer(serializers.ModelSerializer):
         return data
 
 
-class UserSerializer(UserSerializer):
-    is_subscribed = SerializerMethodField(read_only=True)
-
-    class Meta:
-        model = CustomUser
-        fields = ('email', 'id', 'username', 'first_name',
-                  'last_name',
-                  'is_subscribed',
-                  )
-
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if self.context.get('request').user.is_anonymous:
-            return False
-        return obj.following.filter(user=request.user).exists()
-
-
 class SubscribeListSerializer(UserSerializer):
     recipes_count = SerializerMethodField()
     recipes = SerializerMethodField()
@@ -154,12 +171,12 @@ class SubscribeListSerializer(UserSerializer):
         return data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes.filter(is_archived=False).count()
 
     def get_recipes(self, obj):
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
+        recipes = obj.recipes.filter(is_archived=False)
         if limit:
             recipes = recipes[: int(limit)]
         serializer = RecipeSerializer(recipes, many=True, read_only=True)
@@ -228,12 +245,16 @@ class PostPatchRecipeSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        shopping_list.lock_recipe(instance.id)
+        old_amounts = shopping_list.recipe_amounts(instance.id)
         instance.tags.clear()
         IngredientInRecipe.objects.filter(recipe=instance).delete()
         instance.tags.set(validated_data.pop('tags'))
         ingredients = validated_data.pop('ingredients')
         self.create_ingredients(instance, ingredients)
+        shopping_list.recipe_changed(instance.id, old_amounts)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
@@ -0,0 +1,118 @@
+import logging
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle, UserRateThrottle
+
+logger = logging.getLogger(__name__)
+
+EXPENSIVE_LIST_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+class Stats:
+    """ Счетчики отклоненных и объединенных запросов процесса. """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def increment(self, event, name):
+        with self.lock:
+            self.counters[(event, name)] += 1
+            total = self.counters[(event, name)]
+        logger.info('%s: %s (всего %s)', event, name, total)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+stats = Stats()
+
+
+class ThrottleStatsMixin:
+    cache = caches['throttle']
+
+    def throttle_failure(self):
+        stats.increment('throttled', self.scope)
+        return super().throttle_failure()
+
+
+class ExpensiveUserThrottle(ThrottleStatsMixin, UserRateThrottle):
+    """ Лимит тяжелых запросов на пользователя (для анонимов - на IP). """
+    scope = 'expensive_user'
+
+
+class ExpensiveIPThrottle(ThrottleStatsMixin, SimpleRateThrottle):
+    """ Лимит тяжелых запросов с одного IP независимо от пользователя. """
+    scope = 'expensive_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+EXPENSIVE_THROTTLES = (ExpensiveUserThrottle, ExpensiveIPThrottle)
+
+
+def is_expensive_list(request):
+    return any(
+        request.query_params.get(param) not in (None, '', '0')
+        for param in EXPENSIVE_LIST_PARAMS
+    )
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые одновременные вычисления в процессе: пока первый
+    вызов с ключом key выполняется, остальные ждут его и получают тот же
+    результат (или то же исключение). Результат общий для всех ждущих,
+    поэтому функция должна возвращать неизменяемые данные - байты
+    или данные ответа, а не сам объект ответа.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, function, name=''):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            stats.increment('coalesced', name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+single_flight = SingleFlight()
+
+
+def coalesce(request, name, function):
+    """ single_flight.do с ключом из пользователя и полного пути запроса. """
+    key = (name, request.user.pk, request.get_full_path())
+    return single_flight.do(key, function, name)
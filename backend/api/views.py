@@ -1,30 +1,73 @@
-from django.http.response import HttpResponse
+import logging
+
+from django.db import transaction
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
 from api.pagination import CustomPagination
-from recipes.models import (FavoriteRecipes, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from recipes import export, shopping_list
+from recipes.importer import RecipeImporter
+from recipes.models import (FavoriteRecipes, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, SimilarRecipe,
+                            Tag)
 from users.models import CustomUser, Follow
 
 from .filters import IngredientFilter, RecipeFilter
+from .negotiation import IgnoreClientContentNegotiation
 from .permissions import AuthorPermission
+from .relations import invalidate_relations
+from .renderers import FastJSONRenderer
+from .throttling import EXPENSIVE_THROTTLES, coalesce, is_expensive_list
+from .representations import (RECIPE_FIELDS, image_url, ingredient_row,
+                              ingredients_representation, recipe_row,
+                              recipes_representation, tag_row,
+                              tags_representation)
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           PostPatchRecipeSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscribeListSerializer,
-                          TagSerializer, UserSerializer)
-from django.db.models import Sum
+                          ShoppingCartSerializer, ShoppingListItemSerializer,
+                          SubscribeListSerializer, TagSerializer,
+                          UserSerializer)
+
+logger = logging.getLogger(__name__)
+
+
+def get_flag(request, name):
+    """ Флаг из параметров запроса: пусто, 0 и false - выключен. """
+    return request.query_params.get(name, '').lower() not in (
+        '', '0', 'false')
+
+
+def get_servings(request):
+    try:
+        servings = float(request.query_params.get('servings', 1))
+    except ValueError:
+        servings = 0
+    if not 0 < servings <= 100:
+        raise ValidationError(
+            {'servings': 'Укажите множитель порций от 0 до 100'})
+    return servings
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(tags_representation(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(tag_row(self.get_object()))
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -32,21 +75,55 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter, )
     search_fields = ['^name']
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(ingredients_representation(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(ingredient_row(self.get_object()))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.filter(is_archived=False)
     serializer_class = RecipeSerializer
     permission_classes = (AuthorPermission, IsAuthenticatedOrReadOnly)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeSerializer
         return PostPatchRecipeSerializer
 
+    def get_throttles(self):
+        if self.action == 'list' and is_expensive_list(self.request):
+            return [throttle() for throttle in EXPENSIVE_THROTTLES]
+        return super().get_throttles()
+
+    def list(self, request, *args, **kwargs):
+        if is_expensive_list(request):
+            return Response(coalesce(
+                request, 'recipes', lambda: self.list_data(request)))
+        return Response(self.list_data(request))
+
+    def list_data(self, request):
+        queryset = self.filter_queryset(
+            self.get_queryset()).values(*RECIPE_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                recipes_representation(page, request)).data
+        return recipes_representation(queryset, request)
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        return Response(
+            recipes_representation([recipe_row(recipe)], request)[0])
+
     @action(
         detail=True,
         methods=('POST', 'DELETE'),
@@ -62,7 +139,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
             }
             serializer = ShoppingCartSerializer(data=data, context=context)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                shopping_list.lock_recipe(recipe.id)
+                serializer.save()
+            invalidate_relations(request)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         context = {'request': request}
         recipe = get_object_or_404(Recipe, id=pk)
@@ -71,10 +151,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
             'recipe': recipe.id
         }
         serializer = ShoppingCartSerializer(data=data, context=context)
-        if ShoppingCart.objects.filter(user=data['user'],
-                                       recipe=data['recipe']).exists():
-            ShoppingCart.objects.get(user=data['user'],
-                                     recipe=data['recipe']).delete()
+        with transaction.atomic():
+            shopping_list.lock_recipe(recipe.id)
+            deleted, _ = ShoppingCart.objects.filter(
+                user=data['user'], recipe=data['recipe']).delete()
+        if deleted:
+            invalidate_relations(request)
             return Response(
                     {'status': 'Рецепт успешно удален из списка покупок'},
                     status=status.HTTP_200_OK,
@@ -87,24 +169,129 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         methods=['GET'],
         detail=False,
+        permission_classes=[IsAuthenticated],
+        throttle_classes=EXPENSIVE_THROTTLES,
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_list__user=request.user
-        ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        shopping_list = 'Cписок покупок:'
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}")
+        servings = get_servings(request)
+
+        def render():
+            ingredients = shopping_list.consolidated(
+                request.user.id, servings)
+            shopping_cart = 'Cписок покупок:'
+            for ingredient in ingredients:
+                shopping_cart += (
+                    f"\n{ingredient['name']} "
+                    f"({ingredient['measurement_unit']}) - "
+                    f"{shopping_list.format_amount(ingredient['amount'])}")
+            return shopping_cart.encode()
+
         file = 'shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        response = HttpResponse(
+            coalesce(request, 'download_shopping_cart', render),
+            content_type='text/plain',
+        )
         response['Content-Disposition'] = f'attachment; filename="{file}.txt"'
         return response
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        params = request.query_params
+        if get_flag(request, 'consolidate') or 'servings' in params:
+            ingredients = shopping_list.consolidated(
+                request.user.id, get_servings(request))
+            return Response([
+                {**ingredient,
+                 'amount': shopping_list.format_amount(ingredient['amount'])}
+                for ingredient in ingredients
+            ])
+        shopping_list.ensure_built(request.user.id)
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAdminUser],
+        content_negotiation_class=IgnoreClientContentNegotiation,
+    )
+    def export(self, request):
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in export.FORMATS:
+            raise ValidationError(
+                {'type': f'Доступные форматы: {", ".join(export.FORMATS)}'})
+        serialize, content_type = export.FORMATS[export_type]
+        compress = get_flag(request, 'gzip')
+        file = f'recipes.{export_type}'
+        if compress:
+            content_type = 'application/gzip'
+            file += '.gz'
+
+        def report(count, elapsed):
+            logger.info('Выгружено рецептов: %s за %.1f с', count, elapsed)
+
+        response = StreamingHttpResponse(
+            export.iter_encoded(
+                serialize(export.iter_counted(export.iter_recipes(), report)),
+                compress=compress,
+            ),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{file}"'
+        return response
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        permission_classes=[IsAdminUser],
+        url_path='import',
+    )
+    def import_recipes(self, request):
+        # Тело читается построчно из потока, а не через request.body:
+        # так не действует DATA_UPLOAD_MAX_MEMORY_SIZE и память не растет
+        # с размером выгрузки. Файл в multipart сохраняется Django
+        # во временный файл и тоже читается построчно.
+        if request.content_type.startswith('multipart/'):
+            lines = request.FILES.get('file')
+            if lines is None:
+                raise ValidationError({'file': 'Загрузите файл NDJSON'})
+        else:
+            lines = request._request
+        report = RecipeImporter(request.user).run(lines)
+        return Response(
+            report.as_dict(),
+            status=(status.HTTP_201_CREATED if report.created
+                    else status.HTTP_400_BAD_REQUEST),
+        )
+
+    @action(
+        methods=['GET'],
+        detail=True,
+    )
+    def similar(self, request, pk):
+        recipe = self.get_object()
+        recommendations = {kind: [] for kind, _ in SimilarRecipe.KINDS}
+        for row in SimilarRecipe.objects.filter(
+            recipe_id=recipe.id, similar__is_archived=False
+        ).order_by('kind', 'rank').values(
+            'kind', 'similar_id', 'similar__name', 'similar__image',
+            'similar__cooking_time'
+        ):
+            recommendations[row['kind']].append({
+                'id': row['similar_id'],
+                'name': row['similar__name'],
+                'image': image_url(row['similar__image'], request),
+                'cooking_time': row['similar__cooking_time'],
+            })
+        return Response(recommendations)
+
     @action(
         detail=True,
         methods=('POST', 'DELETE'),
@@ -120,6 +307,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer = FavoriteSerializer(data=data, context=context)
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            invalidate_relations(request)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         context = {'request': request}
         recipe = get_object_or_404(Recipe, id=pk)
@@ -132,6 +320,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                           recipe=data['recipe']).exists():
             FavoriteRecipes.objects.get(user=data['user'],
                                         recipe=data['recipe']).delete()
+            invalidate_relations(request)
             return Response(
                 {'status': 'Рецепт успешно удален из списка избранных'},
                 status=status.HTTP_200_OK,
@@ -161,23 +350,28 @@ class UserViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             Follow.objects.create(user=user, author=author)
+            invalidate_relations(request)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
             get_object_or_404(
                 Follow, user=user, author=author
             ).delete()
+            invalidate_relations(request)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return None
 
     @action(detail=False,
+            throttle_classes=EXPENSIVE_THROTTLES,
             )
     def subscriptions(self, request):
-        user = request.user
-        queryset = CustomUser.objects.filter(
-            following__user=user).order_by('username')
-        pages = self.paginate_queryset(queryset)
-        serializer = SubscribeListSerializer(
-            pages, many=True, context={'request': request}
-        )
-        return self.get_paginated_response(serializer.data)
+        def data():
+            queryset = CustomUser.objects.filter(
+                following__user=request.user).order_by('username')
+            pages = self.paginate_queryset(queryset)
+            serializer = SubscribeListSerializer(
+                pages, many=True, context={'request': request}
+            )
+            return self.get_paginated_response(serializer.data).data
+
+        return Response(coalesce(request, 'subscriptions', data))
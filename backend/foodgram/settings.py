@@ -79,6 +79,26 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Роль узла: 'all' - API и админка, 'api' - только API. На узлах API
+# админка, сообщения и import_export не загружаются в воркеры.
+SERVER_ROLE = os.getenv('SERVER_ROLE', default='all')
+ADMIN_ENABLED = SERVER_ROLE != 'api'
+
+if not ADMIN_ENABLED:
+    ADMIN_ONLY = (
+        'django.contrib.admin',
+        'django.contrib.messages',
+        'import_export',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.contrib.messages.context_processors.messages',
+    )
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ADMIN_ONLY]
+    MIDDLEWARE = [name for name in MIDDLEWARE if name not in ADMIN_ONLY]
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        name for name in TEMPLATES[0]['OPTIONS']['context_processors']
+        if name not in ADMIN_ONLY
+    ]
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -98,7 +118,8 @@ else:
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default='5432')
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
         }
     }
 
@@ -149,13 +170,33 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
          "rest_framework.permissions.AllowAny",
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'],
+    # Перед backend стоит один nginx: адрес клиента берется из последнего
+    # значения X-Forwarded-For, подставленные клиентом значения не учитываются.
+    'NUM_PROXIES': 1,
+    'DEFAULT_THROTTLE_RATES': {
+        'expensive_user': os.getenv('THROTTLE_EXPENSIVE_USER',
+                                    default='30/min'),
+        'expensive_ip': os.getenv('THROTTLE_EXPENSIVE_IP',
+                                  default='120/min'),
+    },
+}
+
+# Счетчики лимитов запросов хранятся в памяти процесса.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
 }
 
 
@@ -174,3 +215,21 @@ DJOSER = {
 
     "HIDE_USERS": False,
 }
+
+# Время жизни (в секундах) закешированных между запросами подписок,
+# избранного и корзины пользователя. 0 - кешировать только в пределах запроса.
+# Работает только с кешем, общим для всех процессов (Redis, Memcached):
+# с LocMemCache настройка игнорируется.
+USER_RELATIONS_CACHE_TIMEOUT = int(
+    os.getenv('USER_RELATIONS_CACHE_TIMEOUT', default=0)
+)
+
+# Кеш токенов авторизации: число токенов в памяти процесса, время жизни
+# записи (в секундах, ограничивает задержку отзыва токена в других
+# процессах) и хранение снимков в общем кеше Django. TOKEN_CACHE_SHARED
+# работает только с кешем, общим для всех процессов (Redis, Memcached):
+# с LocMemCache он игнорируется, иначе выход в одном воркере не сбросил бы
+# копии в остальных.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=1024))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=10))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', default='') == 'True'
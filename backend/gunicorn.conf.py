@@ -0,0 +1,36 @@
+"""
+Настройки gunicorn для продакшена.
+
+Приложение загружается один раз в мастер-процессе (preload_app), там же
+импортируются URLconf, представления и сериализаторы. Перед форком
+объекты переносятся в постоянное поколение сборщика мусора (gc.freeze),
+чтобы он не трогал их в воркерах и страницы памяти оставались общими
+(copy-on-write). Представления в основном ждут базу данных, поэтому
+используются потоковые воркеры gthread.
+"""
+import gc
+import multiprocessing
+import os
+from importlib import import_module
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+worker_class = 'gthread'
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=min(multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+preload_app = True
+worker_tmp_dir = '/dev/shm'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=60))
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=0))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    from django.conf import settings
+    from django.db import connections
+
+    import_module(settings.ROOT_URLCONF)
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
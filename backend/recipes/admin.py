@@ -1,14 +1,20 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Substr
 from import_export.admin import ImportExportModelAdmin
 
+from foodgram.pagination import LargeTableAdminMixin
+
+from . import purge
 from .models import (FavoriteRecipes, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingListItem, Tag)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(ImportExportModelAdmin):
+class IngredientAdmin(LargeTableAdminMixin, ImportExportModelAdmin):
     model = Ingredient
     list_display = ['name', 'measurement_unit']
+    search_fields = ['name']
 
 
 @admin.register(Tag)
@@ -17,20 +23,69 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'text', 'cooking_time']
+class RecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['name', 'author', 'short_text', 'cooking_time',
+                    'favorites_count', 'is_archived']
+    list_select_related = ['author']
+    list_filter = ['is_archived']
+    search_fields = ['name']
+    autocomplete_fields = ['author']
+    actions = ['archive_recipes', 'purge_recipes']
+
+    def get_queryset(self, request):
+        favorites = FavoriteRecipes.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(count=Count('*'))
+        return super().get_queryset(request).defer('text').annotate(
+            text_preview=Substr('text', 1, 80),
+            favorites_count=Subquery(
+                favorites.values('count'), output_field=IntegerField()),
+        )
+
+    @admin.display(description='Описание')
+    def short_text(self, obj):
+        return obj.text_preview
+
+    @admin.display(description='В избранном',
+                   ordering='favorites_count')
+    def favorites_count(self, obj):
+        return obj.favorites_count or 0
+
+    @admin.action(description='Перенести в архив')
+    def archive_recipes(self, request, queryset):
+        count = purge.archive_recipes(queryset)
+        self.message_user(request, f'В архив перенесено рецептов: {count}')
+
+    @admin.action(description='Удалить пачками со всеми связями',
+                  permissions=['delete'])
+    def purge_recipes(self, request, queryset):
+        count = purge.purge_recipes(queryset, archive=True)
+        self.message_user(request, f'Удалено рецептов: {count}')
 
 
 @admin.register(IngredientInRecipe)
-class IngredientInRecipeAdmin(admin.ModelAdmin):
+class IngredientInRecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['ingredient', 'recipe', "amount"]
+    list_select_related = ['ingredient', 'recipe']
+    autocomplete_fields = ['ingredient', 'recipe']
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'recipe']
+    list_select_related = ['user', 'recipe']
+    autocomplete_fields = ['user', 'recipe']
 
 
 @admin.register(FavoriteRecipes)
-class FavoriteRecipesAdmin(admin.ModelAdmin):
+class FavoriteRecipesAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'recipe']
+    list_select_related = ['user', 'recipe']
+    autocomplete_fields = ['user', 'recipe']
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['user', 'ingredient', 'total_amount']
+    list_select_related = ['user', 'ingredient']
+    autocomplete_fields = ['user', 'ingredient']
@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import time
+import zlib
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import IngredientInRecipe, Recipe
+
+CHUNK_SIZE = 2000
+RECIPE_FIELDS = (
+    'id', 'name', 'text', 'cooking_time', 'image', 'pub_date', 'is_archived',
+)
+AUTHOR_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+INGREDIENT_FIELDS = ('name', 'measurement_unit', 'amount')
+CSV_HEADER = (
+    'recipe_id', 'recipe_name', 'author_username', 'cooking_time',
+    'pub_date', 'tags', 'ingredient_name', 'measurement_unit', 'amount',
+)
+
+
+def _grouped(rows):
+    """ (recipe_id, [строки]) из строк, упорядоченных по recipe_id. """
+    for recipe_id, group in groupby(rows, key=itemgetter(0)):
+        yield recipe_id, [row[1:] for row in group]
+
+
+def _lookup(groups):
+    """ Возвращает функцию, отдающую строки рецепта из упорядоченного
+    потока групп; рецепты запрашиваются по возрастанию id. """
+    groups = iter(groups)
+    current = next(groups, None)
+
+    def rows_for(recipe_id):
+        nonlocal current
+        while current is not None and current[0] < recipe_id:
+            current = next(groups, None)
+        if current is not None and current[0] == recipe_id:
+            return current[1]
+        return []
+    return rows_for
+
+
+def iter_recipes(chunk_size=CHUNK_SIZE):
+    """
+    Рецепты каталога вместе с автором, тегами и ингредиентами.
+    Три запроса читаются серверными курсорами по chunk_size строк
+    в порядке id рецепта и сливаются за один проход, поэтому память
+    не зависит от размера каталога.
+    """
+    recipes = Recipe.objects.order_by('id').values_list(
+        *RECIPE_FIELDS, *('author__' + field for field in AUTHOR_FIELDS)
+    ).iterator(chunk_size)
+    ingredients = _lookup(_grouped(
+        IngredientInRecipe.objects.order_by('recipe_id', 'id').values_list(
+            'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+            'amount'
+        ).iterator(chunk_size)
+    ))
+    tags = _lookup(_grouped(
+        Recipe.tags.through.objects.order_by('recipe_id', 'id').values_list(
+            'recipe_id', 'tag__slug'
+        ).iterator(chunk_size)
+    ))
+    for row in recipes:
+        recipe = dict(zip(RECIPE_FIELDS, row))
+        recipe['author'] = dict(zip(AUTHOR_FIELDS, row[len(RECIPE_FIELDS):]))
+        recipe['tags'] = [slug for slug, in tags(recipe['id'])]
+        recipe['ingredients'] = [
+            dict(zip(INGREDIENT_FIELDS, values))
+            for values in ingredients(recipe['id'])
+        ]
+        yield recipe
+
+
+def iter_counted(recipes, report):
+    """ Пропускает рецепты через себя и по окончании вызывает
+    report(число рецептов, секунды). """
+    count = 0
+    started = time.monotonic()
+    for recipe in recipes:
+        count += 1
+        yield recipe
+    report(count, time.monotonic() - started)
+
+
+def iter_ndjson(recipes):
+    for recipe in recipes:
+        yield json.dumps(
+            recipe, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_csv(recipes):
+    """ Одна строка CSV на ингредиент рецепта. """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+    for recipe in recipes:
+        buffer.seek(0)
+        buffer.truncate()
+        common = (
+            recipe['id'], recipe['name'], recipe['author']['username'],
+            recipe['cooking_time'], recipe['pub_date'].isoformat(),
+            '|'.join(recipe['tags']),
+        )
+        for ingredient in recipe['ingredients'] or [{}]:
+            writer.writerow(common + tuple(
+                ingredient.get(field, '') for field in INGREDIENT_FIELDS
+            ))
+        yield buffer.getvalue()
+
+
+FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
+
+
+def iter_encoded(lines, compress=False, flush_size=64 * 1024):
+    """ Кодирует строки в UTF-8 и при compress сжимает их в gzip на лету,
+    отдавая блоки примерно по flush_size байт. """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = []
+    pending_size = 0
+    for line in lines:
+        data = line.encode()
+        if compress:
+            data = compressor.compress(data)
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= flush_size:
+            yield b''.join(pending)
+            pending = []
+            pending_size = 0
+    if compress:
+        pending.append(compressor.flush())
+    yield b''.join(pending)
@@ -0,0 +1,238 @@
+import base64
+import binascii
+import io
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from PIL import Image
+
+from users.models import CustomUser
+
+from .models import Ingredient, IngredientInRecipe, Recipe, Tag
+from .purge import delete_unreferenced_images
+
+CHUNK_SIZE = 500
+WORKERS = 4
+MAX_AMOUNT = 32767
+MAX_COOKING_TIME = 2147483647
+
+
+class RecipeImportError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def fail(self, line, error):
+        self.errors.append({'line': line, 'error': str(error)})
+
+    def as_dict(self):
+        return {'created': self.created, 'errors': self.errors}
+
+
+def _author_key(document):
+    author = document.get('author')
+    if isinstance(author, dict):
+        author = author.get('username') or author.get('email')
+    return author if isinstance(author, str) else None
+
+
+def _image_field():
+    return Recipe._meta.get_field('image')
+
+
+def save_image(value):
+    """
+    Сохраняет картинку рецепта и возвращает ее имя в хранилище.
+    value - data URI в base64, как в API, или имя уже сохраненного файла.
+    """
+    if not isinstance(value, str) or not value:
+        raise RecipeImportError('Не указана картинка')
+    field = _image_field()
+    if not value.startswith('data:'):
+        try:
+            exists = field.storage.exists(value)
+        except (SuspiciousOperation, ValueError, OSError):
+            exists = False
+        if not exists:
+            raise RecipeImportError(f'Картинка {value} не найдена')
+        return value
+    try:
+        data = base64.b64decode(value.partition(';base64,')[2], validate=True)
+        image = Image.open(io.BytesIO(data))
+        image.verify()
+    except (binascii.Error, ValueError, OSError,
+            Image.DecompressionBombError):
+        raise RecipeImportError('Некорректная картинка')
+    name = field.generate_filename(
+        None, f'{uuid.uuid4()}.{image.format.lower()}')
+    try:
+        return field.storage.save(name, ContentFile(data))
+    except (SuspiciousOperation, ValueError, OSError) as error:
+        raise RecipeImportError(f'Не удалось сохранить картинку: {error}')
+
+
+class RecipeImporter:
+    """
+    Массовый импорт рецептов из документов NDJSON (формат выгрузки
+    export_recipes). Имена ингредиентов, тегов и авторов переводятся
+    в id одним запросом на пачку, рецепты, теги и ингредиенты рецептов
+    вставляются через bulk_create, картинки сохраняются в пуле потоков.
+    Ошибочные документы пропускаются и попадают в отчет.
+    """
+
+    def __init__(self, default_author=None, chunk_size=CHUNK_SIZE,
+                 workers=WORKERS):
+        self.default_author = default_author
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.ingredients = {
+            (name, unit): ingredient_id
+            for ingredient_id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+
+    def run(self, lines, report=None):
+        report = report or ImportReport()
+        chunk = []
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode()
+            if not line.strip():
+                continue
+            try:
+                document = json.loads(line)
+                if not isinstance(document, dict):
+                    raise ValueError('Ожидается объект JSON')
+            except ValueError as error:
+                report.fail(number, error)
+                continue
+            chunk.append((number, document))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk, report)
+        return report
+
+    def resolve_authors(self, chunk):
+        keys = {_author_key(document) for _, document in chunk} - {None}
+        authors = {}
+        for user_id, username, email in CustomUser.objects.filter(
+            Q(username__in=keys) | Q(email__in=keys)
+        ).values_list('id', 'username', 'email'):
+            authors[username] = authors[email] = user_id
+        return authors
+
+    def build(self, document, authors):
+        """ Проверяет документ и возвращает (Recipe, id тегов,
+        [(id ингредиента, количество)]) без картинки. """
+        key = _author_key(document)
+        if key is None and document.get('author') is not None:
+            raise RecipeImportError('Некорректный автор')
+        if key is None and self.default_author is not None:
+            author_id = self.default_author.id
+        elif key in authors:
+            author_id = authors[key]
+        else:
+            raise RecipeImportError(f'Автор {key} не найден')
+        try:
+            name = str(document['name'])
+            text = str(document['text'])
+            cooking_time = int(document['cooking_time'])
+        except (KeyError, TypeError, ValueError):
+            raise RecipeImportError('Нужны name, text и cooking_time')
+        if not name or len(name) > 200:
+            raise RecipeImportError('Название - от 1 до 200 символов')
+        if not 1 <= cooking_time <= MAX_COOKING_TIME:
+            raise RecipeImportError(
+                f'Время приготовления - от 1 до {MAX_COOKING_TIME}')
+        try:
+            tag_ids = [self.tags[slug] for slug in document.get('tags', [])]
+        except (KeyError, TypeError) as error:
+            raise RecipeImportError(f'Тег {error} не найден')
+        items = document.get('ingredients') or []
+        if not isinstance(items, list):
+            raise RecipeImportError('ingredients должен быть списком')
+        ingredients = {}
+        for item in items:
+            try:
+                ingredient_id = self.ingredients[
+                    (item['name'], item['measurement_unit'])]
+                amount = int(item['amount'])
+            except (KeyError, TypeError, ValueError):
+                raise RecipeImportError(f'Некорректный ингредиент {item}')
+            if not 1 <= amount <= MAX_AMOUNT or ingredient_id in ingredients:
+                raise RecipeImportError(f'Некорректный ингредиент {item}')
+            ingredients[ingredient_id] = amount
+        if not ingredients:
+            raise RecipeImportError('Отсутствуют ингридиенты')
+        recipe = Recipe(
+            author_id=author_id, name=name, text=text,
+            cooking_time=cooking_time,
+        )
+        return recipe, set(tag_ids), list(ingredients.items())
+
+    def import_chunk(self, chunk, report):
+        authors = self.resolve_authors(chunk)
+        built = []
+        for number, document in chunk:
+            try:
+                built.append(
+                    (number, document, self.build(document, authors)))
+            except RecipeImportError as error:
+                report.fail(number, error)
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(save_image, document.get('image'))
+                for _, document, _ in built
+            ]
+        ready = []
+        for (number, _, parts), future in zip(built, futures):
+            try:
+                parts[0].image = future.result()
+            except RecipeImportError as error:
+                report.fail(number, error)
+                continue
+            ready.append((number, parts))
+        if not ready:
+            return
+        try:
+            with transaction.atomic():
+                self.insert([parts for _, parts in ready])
+        except DatabaseError as error:
+            for number, _ in ready:
+                report.fail(number, error)
+            delete_unreferenced_images(
+                recipe.image.name for _, (recipe, _, _) in ready)
+            return
+        report.created += len(ready)
+
+    def insert(self, rows):
+        recipes = [recipe for recipe, _, _ in rows]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe, tag_ids, _ in rows for tag_id in tag_ids
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_id=recipe.id, ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for recipe, _, ingredients in rows
+            for ingredient_id, amount in ingredients
+        )
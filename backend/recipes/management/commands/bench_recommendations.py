@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from recipes.recommendations import TOP_K, top_k_similar, weighted_features
+
+
+class Command(BaseCommand):
+    help = ('Замеряет расчет соседей на случайных данных без базы: '
+            'по умолчанию 100 тыс. рецептов и 1 млн добавлений в избранное.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--favorites', type=int, default=1_000_000)
+        parser.add_argument('--ingredients', type=int, default=2_000)
+        parser.add_argument('--per-recipe', type=int, default=8,
+                            help='ингредиентов в рецепте')
+        parser.add_argument('--sample', type=int,
+                            help='считать соседей только для N рецептов '
+                                 'и оценить полное время')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        recipes = options['recipes']
+        favorites = sparse.csr_matrix(
+            (np.ones(options['favorites'], dtype=np.float32),
+             (rng.zipf(1.3, options['favorites']) % recipes,
+              rng.integers(0, options['users'], options['favorites']))),
+            shape=(recipes, options['users']),
+        )
+        favorites.data[:] = 1
+        content = weighted_features(sparse.csr_matrix(
+            (np.ones(recipes * options['per_recipe'], dtype=np.float32),
+             (np.repeat(np.arange(recipes), options['per_recipe']),
+              rng.zipf(1.5, recipes * options['per_recipe'])
+              % options['ingredients'])),
+            shape=(recipes, options['ingredients']),
+        ))
+        rows = np.arange(recipes)
+        if options['sample']:
+            rows = rng.choice(recipes, options['sample'], replace=False)
+        for name, matrix in (('избранное', favorites),
+                             ('ингредиенты', content)):
+            started = time.monotonic()
+            top_k_similar(matrix, TOP_K, rows)
+            elapsed = time.monotonic() - started
+            full = elapsed * recipes / len(rows)
+            self.stdout.write(
+                f'{name}: {matrix.shape[0]}x{matrix.shape[1]}, '
+                f'{matrix.nnz} ненулевых, {len(rows)} рецептов '
+                f'за {elapsed:.1f} с (весь каталог ~{full:.0f} с)'
+            )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Считает похожие рецепты по ингредиентам и тегам и рецепты, '
+            'которые добавляют в избранное вместе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+',
+                            help='пересчитать только эти рецепты')
+        parser.add_argument('--missing', action='store_true',
+                            help='пересчитать только рецепты без соседей')
+        parser.add_argument('--top', type=int, default=recommendations.TOP_K,
+                            help='число соседей на рецепт')
+
+    def handle(self, *args, **options):
+        only = options['recipes']
+        if options['missing']:
+            only = list(recommendations.missing())
+        started = time.monotonic()
+        count = recommendations.build(only, options['top'])
+        self.stdout.write(
+            f'Соседи посчитаны для {count} рецептов '
+            f'за {time.monotonic() - started:.1f} с'
+        )
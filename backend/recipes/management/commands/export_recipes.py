@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes import export
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает каталог рецептов с авторами, тегами '
+            'и ингредиентами в NDJSON или CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS,
+                            default='ndjson', dest='export_format')
+        parser.add_argument('--output', '-o',
+                            help='файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--gzip', action='store_true',
+                            help='сжимать выгрузку в gzip')
+        parser.add_argument('--chunk-size', type=int,
+                            default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        serialize, _ = export.FORMATS[options['export_format']]
+        chunks = export.iter_encoded(
+            serialize(export.iter_counted(
+                export.iter_recipes(options['chunk_size']), self.report)),
+            compress=options['gzip'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+
+    def report(self, count, elapsed):
+        self.stderr.write(
+            f'Выгружено рецептов: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} в сек.)'
+        )
@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.purge import delete_unreferenced_images
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки рецептов, сохраненные до ContentHashStorage, '
+            'в хранилище с именами по хешу содержимого.')
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        names = list(Recipe.objects.exclude(
+            image__startswith=field.upload_to
+        ).values_list('image', flat=True).distinct())
+        moved = 0
+        for name in names:
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла {name}')
+                continue
+            with storage.open(name) as file:
+                hashed = storage.save(
+                    field.generate_filename(None, os.path.basename(name)),
+                    file,
+                )
+            Recipe.objects.filter(image=name).update(image=hashed)
+            delete_unreferenced_images([name])
+            moved += 1
+        self.stdout.write(f'Перенесено картинок: {moved}')
@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importer import CHUNK_SIZE, WORKERS, RecipeImporter
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Массово импортирует рецепты из NDJSON '
+            '(формат выгрузки export_recipes).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            help='файл NDJSON (по умолчанию stdin)')
+        parser.add_argument('--author',
+                            help='username автора для документов без автора')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=WORKERS,
+                            help='потоков для сохранения картинок')
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = CustomUser.objects.filter(
+                username=options['author']).first()
+            if author is None:
+                raise CommandError('Автор не найден')
+        importer = RecipeImporter(
+            author, options['chunk_size'], options['workers'])
+        started = time.monotonic()
+        if options['path']:
+            with open(options['path'], encoding='utf-8') as lines:
+                report = importer.run(lines)
+        else:
+            report = importer.run(sys.stdin)
+        elapsed = time.monotonic() - started
+        for error in report.errors:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        self.stdout.write(
+            f'Импортировано рецептов: {report.created}, ошибок: '
+            f'{len(report.errors)} за {elapsed:.1f} с '
+            f'({report.created * 60 / max(elapsed, 1e-9):.0f} в минуту)'
+        )
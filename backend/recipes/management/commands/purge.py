@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import purge
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Пачками удаляет рецепты и пользователей со всеми связями '
+            'и чистит неиспользуемые картинки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+',
+                            help='id рецептов для удаления')
+        parser.add_argument('--users', type=int, nargs='+',
+                            help='id пользователей для удаления')
+        parser.add_argument('--archived', action='store_true',
+                            help='удалить все рецепты из архива')
+        parser.add_argument('--archive-first', action='store_true',
+                            help='сначала скрыть рецепты, потом удалять')
+        parser.add_argument('--archive-only', action='store_true',
+                            help='только перенести рецепты в архив')
+        parser.add_argument('--orphaned-media', action='store_true',
+                            help='удалить картинки без рецептов')
+        parser.add_argument('--min-age', type=int, default=purge.MIN_AGE,
+                            help='не трогать картинки моложе (сек.)')
+        parser.add_argument('--batch-size', type=int,
+                            default=purge.BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=purge.PAUSE,
+                            help='пауза между пачками (сек.)')
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in (
+                'recipes', 'users', 'archived', 'orphaned_media')):
+            raise CommandError(
+                'Укажите --recipes, --users, --archived или --orphaned-media')
+        self.started = time.monotonic()
+        params = {
+            'batch_size': options['batch_size'],
+            'pause': options['pause'],
+            'archive': options['archive_first'],
+            'progress': self.progress,
+        }
+        recipes = Recipe.objects.none()
+        if options['recipes']:
+            recipes = Recipe.objects.filter(id__in=options['recipes'])
+        if options['archived']:
+            recipes |= Recipe.objects.filter(is_archived=True)
+        if options['archive_only']:
+            count = purge.archive_recipes(recipes)
+            self.stdout.write(f'В архив перенесено рецептов: {count}')
+            return
+        if options['recipes'] or options['archived']:
+            count = purge.purge_recipes(recipes, **params)
+            self.stdout.write(f'Удалено рецептов: {count}')
+        if options['users']:
+            count = purge.purge_users(
+                CustomUser.objects.filter(id__in=options['users']), **params)
+            self.stdout.write(f'Удалено пользователей: {count}')
+        if options['orphaned_media']:
+            count = purge.delete_orphaned_media(options['min_age'])
+            self.stdout.write(f'Удалено картинок: {count}')
+
+    def progress(self, deleted, total):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'{deleted}/{total} рецептов, {deleted / elapsed:.0f} в сек.')
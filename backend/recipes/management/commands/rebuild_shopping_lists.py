@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_list import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Сверяет сохраненные списки покупок с корзинами '
+            'и пересобирает расходящиеся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='user_ids',
+            help='id пользователей для проверки (по умолчанию все)',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='только сообщить о расхождениях, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        mismatched = rebuild(options['user_ids'], options['check'])
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        users = ', '.join(map(str, mismatched))
+        if options['check']:
+            raise CommandError(
+                f'Найдены расхождения у {len(mismatched)} '
+                f'пользователей: {users}'
+            )
+        self.stdout.write(self.style.WARNING(
+            f'Пересобраны списки {len(mismatched)} пользователей: {users}'
+        ))
@@ -4,6 +4,8 @@ from django.db.models import UniqueConstraint
 
 from users.models import CustomUser
 
+from .storage import ContentHashStorage
+
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=150, db_index=True)
@@ -36,7 +38,8 @@ class Recipe(models.Model):
         Ingredient, through='IngredientInRecipe'
     )
     tags = models.ManyToManyField(Tag)
-    image = models.ImageField(blank=False)
+    image = models.ImageField(
+        blank=False, upload_to='recipes/', storage=ContentHashStorage())
     name = models.CharField(max_length=200)
     text = models.TextField()
     cooking_time = models.PositiveIntegerField(
@@ -44,6 +47,10 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True
     )
+    is_archived = models.BooleanField(
+        default=False,
+        verbose_name='В архиве',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
@@ -73,8 +80,9 @@ class IngredientInRecipe(models.Model):
         verbose_name_plural = 'Ингредиенты рецепта'
 
     def __str__(self):
+        ingredient = self.ingredient
         return (
-            f'{self.ingredient.name} :: {self.ingredient.measurement_unit}'
+            f'{ingredient.name} :: {ingredient.measurement_unit}'
             f' - {self.amount} '
         )
 
@@ -127,3 +135,72 @@ class FavoriteRecipes(models.Model):
         default_related_name = 'favorites'
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+
+
+class ShoppingListItem(models.Model):
+    """ Суммарное количество ингредиента в корзине пользователя. """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='%(app_label)s_%(class)s_unique'
+            )
+        ]
+        default_related_name = 'shopping_list_items'
+        verbose_name = 'Продукт из списка покупок'
+        verbose_name_plural = 'Список покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.total_amount}'
+
+
+class SimilarRecipe(models.Model):
+    """ Один из ближайших соседей рецепта, посчитанных командой
+    build_recommendations. """
+    SIMILAR = 'similar'
+    ALSO_FAVORITED = 'also_favorited'
+    KINDS = (
+        (SIMILAR, 'Похожие по ингредиентам и тегам'),
+        (ALSO_FAVORITED, 'С этим рецептом также добавляют в избранное'),
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        db_index=False,
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    kind = models.CharField(max_length=16, choices=KINDS)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('recipe', 'kind', 'rank'),
+                name='%(app_label)s_%(class)s_unique'
+            )
+        ]
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
@@ -0,0 +1,153 @@
+import os
+import time
+
+from django.db import transaction
+
+from users.models import CustomUser, Follow
+
+from . import shopping_list
+from .models import (FavoriteRecipes, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, SimilarRecipe)
+
+BATCH_SIZE = 500
+PAUSE = 0.1
+MIN_AGE = 3600
+
+
+def _raw_delete(queryset):
+    # Удаление одним DELETE ... WHERE без коллектора Django:
+    # связанные строки к этому моменту уже удалены явно.
+    return queryset._raw_delete(queryset.db)
+
+
+def _image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def delete_unreferenced_images(names, min_age=MIN_AGE):
+    """
+    Удаляет файлы картинок, на которые больше не ссылается ни один
+    рецепт (одинаковые картинки могут использоваться несколькими).
+    Файлы, измененные за последние min_age секунд, пропускаются:
+    ContentHashStorage обновляет время изменения при повторной загрузке,
+    и ссылка на такой файл может быть еще не сохранена. Их позже удалит
+    delete_orphaned_media.
+    """
+    names = set(names) - {''}
+    if not names:
+        return 0
+    names -= set(Recipe.objects.filter(
+        image__in=names).values_list('image', flat=True))
+    storage = _image_storage()
+    deadline = time.time() - min_age
+    deleted = 0
+    for name in names:
+        try:
+            if os.path.getmtime(storage.path(name)) >= deadline:
+                continue
+        except OSError:
+            continue
+        storage.delete(name)
+        deleted += 1
+    return deleted
+
+
+def archive_recipes(queryset):
+    return queryset.update(is_archived=True)
+
+
+def delete_in_batches(queryset, batch_size=BATCH_SIZE, pause=PAUSE):
+    deleted = 0
+    while True:
+        batch = list(queryset.order_by('pk').values_list(
+            'pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += _raw_delete(queryset.model.objects.filter(pk__in=batch))
+        time.sleep(pause)
+
+
+def purge_recipes(queryset, batch_size=BATCH_SIZE, pause=PAUSE,
+                  archive=False, progress=None):
+    """
+    Удаляет рецепты пачками по batch_size вместе с ингредиентами, тегами,
+    избранным и корзинами, не загружая объекты в память и без сигналов.
+    Между пачками выдерживается pause секунд, чтобы не мешать рабочей
+    нагрузке. С archive=True рецепты сначала одним UPDATE скрываются из
+    API. id рецептов читаются заранее, поэтому queryset может фильтровать
+    по is_archived. progress(удалено, всего) вызывается после каждой пачки.
+    """
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    total = len(ids)
+    if archive:
+        archive_recipes(Recipe.objects.filter(id__in=ids))
+    deleted = 0
+    for start in range(0, total, batch_size):
+        batch = ids[start:start + batch_size]
+        with transaction.atomic():
+            cart_users = set(ShoppingCart.objects.filter(
+                recipe_id__in=batch).values_list('user_id', flat=True))
+            images = set(Recipe.objects.filter(
+                id__in=batch).values_list('image', flat=True))
+            for model in (IngredientInRecipe, ShoppingCart,
+                          FavoriteRecipes, Recipe.tags.through,
+                          SimilarRecipe):
+                _raw_delete(model.objects.filter(recipe_id__in=batch))
+            _raw_delete(SimilarRecipe.objects.filter(similar_id__in=batch))
+            deleted += _raw_delete(Recipe.objects.filter(id__in=batch))
+            if cart_users:
+                shopping_list.rebuild(cart_users)
+        delete_unreferenced_images(images)
+        if progress is not None:
+            progress(deleted, total)
+        time.sleep(pause)
+    return deleted
+
+
+def purge_users(queryset, batch_size=BATCH_SIZE, pause=PAUSE,
+                archive=False, progress=None):
+    """
+    Удаляет пользователей: сначала их рецепты через purge_recipes,
+    затем подписки, избранное, корзины и списки покупок пачками.
+    Оставшиеся связи (токен, журнал админки) удаляет обычный delete().
+    """
+    deleted = 0
+    for user_id in list(queryset.values_list('id', flat=True)):
+        purge_recipes(Recipe.objects.filter(author_id=user_id),
+                      batch_size, pause, archive, progress)
+        for model, field in ((Follow, 'user'), (Follow, 'author'),
+                             (ShoppingCart, 'user'),
+                             (FavoriteRecipes, 'user'),
+                             (ShoppingListItem, 'user')):
+            delete_in_batches(model.objects.filter(**{field: user_id}),
+                              batch_size, pause)
+        CustomUser.objects.filter(id=user_id).delete()
+        deleted += 1
+    return deleted
+
+
+def delete_orphaned_media(min_age=MIN_AGE):
+    """
+    Удаляет из хранилища картинки, на которые не ссылается ни один рецепт.
+    Файлы моложе min_age секунд пропускаются: они могут принадлежать
+    рецепту, который еще сохраняется.
+    """
+    storage = _image_storage()
+    deadline = time.time() - min_age
+    deleted = 0
+
+    def walk(path):
+        directories, files = storage.listdir(path)
+        for name in files:
+            yield os.path.join(path, name) if path else name
+        for directory in directories:
+            yield from walk(os.path.join(path, directory))
+
+    candidates = []
+    for name in walk(''):
+        if os.path.getmtime(storage.path(name)) < deadline:
+            candidates.append(name)
+        if len(candidates) >= BATCH_SIZE:
+            deleted += delete_unreferenced_images(candidates, min_age)
+            candidates = []
+    return deleted + delete_unreferenced_images(candidates, min_age)
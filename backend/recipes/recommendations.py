@@ -0,0 +1,210 @@
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from .models import (FavoriteRecipes, IngredientInRecipe, Recipe,
+                     ShoppingCart, SimilarRecipe)
+
+TOP_K = 10
+CART_WEIGHT = 0.5
+TAG_WEIGHT = 1.0
+MAX_FEATURE_SHARE = 0.05
+MIN_PRUNED_COUNT = 1000
+BLOCK_CELLS = 20_000_000
+
+
+def _pairs(queryset, first, second, recipe_ids, chunk_size=10000):
+    """
+    Пары (позиция рецепта в recipe_ids, second) из queryset, прочитанные
+    без создания списка кортежей. Пары рецептов, которых нет
+    в recipe_ids (архивные или добавленные во время расчета), отбрасываются.
+    """
+    rows = np.fromiter(
+        chain.from_iterable(queryset.values_list(
+            first, second).iterator(chunk_size)),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    positions = np.minimum(
+        np.searchsorted(recipe_ids, rows[:, 0]), len(recipe_ids) - 1)
+    known = recipe_ids[positions] == rows[:, 0]
+    return positions[known], rows[known, 1]
+
+
+def _index(ids, values):
+    """ Позиции values в отсортированном массиве ids. """
+    return np.searchsorted(ids, values)
+
+
+def interactions_matrix(recipe_ids):
+    """ Рецепты x пользователи: 1 за избранное, CART_WEIGHT за корзину. """
+    users = []
+    parts = []
+    for model, weight in ((FavoriteRecipes, 1.0),
+                          (ShoppingCart, CART_WEIGHT)):
+        recipes, user_ids = _pairs(
+            model.objects.all(), 'recipe_id', 'user_id', recipe_ids)
+        users.append(user_ids)
+        parts.append((recipes, user_ids, weight))
+    user_ids = np.unique(np.concatenate(users))
+    matrix = sparse.csr_matrix((len(recipe_ids), len(user_ids)))
+    for recipes, users, weight in parts:
+        matrix = matrix.maximum(sparse.csr_matrix(
+            (np.full(len(recipes), weight),
+             (recipes, _index(user_ids, users))),
+            shape=matrix.shape,
+        ))
+    return matrix
+
+
+def content_matrix(recipe_ids):
+    """ Рецепты x (ингредиенты + теги), взвешенные weighted_features. """
+    recipes, ingredients = _pairs(
+        IngredientInRecipe.objects.all(), 'recipe_id', 'ingredient_id',
+        recipe_ids)
+    tag_recipes, tags = _pairs(
+        Recipe.tags.through.objects.all(), 'recipe_id', 'tag_id',
+        recipe_ids)
+    ingredient_ids = np.unique(ingredients)
+    tag_ids = np.unique(tags)
+    rows = np.concatenate([recipes, tag_recipes])
+    columns = np.concatenate([
+        _index(ingredient_ids, ingredients),
+        len(ingredient_ids) + _index(tag_ids, tags),
+    ])
+    weights = np.concatenate([np.ones(len(recipes)),
+                              np.full(len(tags), TAG_WEIGHT)])
+    return weighted_features(sparse.csr_matrix(
+        (weights, (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids) + len(tag_ids)),
+    ))
+
+
+def weighted_features(matrix):
+    """
+    Взвешивает признаки по IDF и отбрасывает те, что есть больше чем
+    у MAX_FEATURE_SHARE объектов (и не меньше чем у MIN_PRUNED_COUNT):
+    соль или сахар почти ничего не говорят о сходстве, но делают
+    произведение матриц почти плотным.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + matrix.shape[0]) / (1 + frequency)) + 1
+    limit = max(MAX_FEATURE_SHARE * matrix.shape[0], MIN_PRUNED_COUNT)
+    idf[frequency > limit] = 0
+    matrix = matrix @ sparse.diags(idf)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def top_k_similar(matrix, k=TOP_K, rows=None):
+    """
+    Для строк rows матрицы объекты x признаки возвращает (соседи, оценки)
+    формы (len(rows), k) по косинусному сходству, без самой строки;
+    недостающие соседи имеют оценку 0. Сходство считается разреженным
+    произведением блоками строк, чтобы в блоке было не больше
+    BLOCK_CELLS ячеек. Лучшие k выбираются сортировкой ненулевых значений
+    блока, а для почти плотного блока - argpartition по строкам.
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    normalized = sparse.diags(1 / norms) @ matrix
+    transposed = normalized.T.tocsr()
+    count = matrix.shape[0]
+    rows = np.arange(count) if rows is None else np.asarray(rows)
+    neighbors = np.zeros((len(rows), k), dtype=np.int64)
+    scores = np.zeros((len(rows), k), dtype=np.float32)
+    if not count or not k:
+        return neighbors, scores
+    block_size = max(1, BLOCK_CELLS // count)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        similarity = (normalized[block] @ transposed).tocsr()
+        if similarity.nnz * 4 > similarity.shape[0] * count:
+            dense = similarity.toarray()
+            dense[np.arange(len(block)), block] = 0
+            top = np.argpartition(-dense, min(k, count) - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(dense, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            width = order.shape[1]
+            neighbors[start:start + len(block), :width] = (
+                np.take_along_axis(top, order, axis=1))
+            scores[start:start + len(block), :width] = (
+                np.take_along_axis(top_scores, order, axis=1))
+            continue
+        owners = np.repeat(
+            np.arange(len(block)), np.diff(similarity.indptr))
+        keep = (similarity.indices != block[owners]) & (similarity.data > 0)
+        owners = owners[keep]
+        columns = similarity.indices[keep]
+        values = similarity.data[keep]
+        order = np.lexsort((-values, owners))
+        owners, columns, values = owners[order], columns[order], values[order]
+        ranks = (np.arange(len(owners))
+                 - np.searchsorted(owners, np.arange(len(block)))[owners])
+        best = ranks < k
+        neighbors[start + owners[best], ranks[best]] = columns[best]
+        scores[start + owners[best], ranks[best]] = values[best]
+    return neighbors, scores
+
+
+def _rows(recipe_ids, rows, kind, neighbors, scores):
+    for row, row_neighbors, row_scores in zip(rows, neighbors, scores):
+        rank = 0
+        for neighbor, score in zip(row_neighbors, row_scores):
+            if score <= 0:
+                break
+            yield SimilarRecipe(
+                recipe_id=int(recipe_ids[row]),
+                similar_id=int(recipe_ids[neighbor]),
+                kind=kind, rank=rank, score=float(score),
+            )
+            rank += 1
+
+
+def build(only=None, k=TOP_K, batch_size=5000):
+    """
+    Пересчитывает соседей рецептов. С only - только для указанных id
+    рецептов (сходство по-прежнему считается со всем каталогом).
+    Возвращает число рецептов, для которых сохранены соседи.
+    """
+    recipe_ids = np.array(sorted(Recipe.objects.filter(
+        is_archived=False).values_list('id', flat=True)), dtype=np.int64)
+    rows = None
+    if only is not None:
+        only = np.unique(np.asarray(list(only), dtype=np.int64))
+        only = only[np.isin(only, recipe_ids)]
+        rows = _index(recipe_ids, only)
+    targets = recipe_ids if rows is None else recipe_ids[rows]
+    if not len(targets):
+        return 0
+    rows = np.arange(len(recipe_ids)) if rows is None else rows
+    results = []
+    for kind, matrix in (
+        (SimilarRecipe.SIMILAR, content_matrix(recipe_ids)),
+        (SimilarRecipe.ALSO_FAVORITED, interactions_matrix(recipe_ids)),
+    ):
+        neighbors, scores = top_k_similar(matrix, k, rows)
+        results.append((kind, neighbors, scores))
+    with transaction.atomic():
+        stale = SimilarRecipe.objects.all()
+        if only is not None:
+            stale = stale.filter(recipe_id__in=targets.tolist())
+        stale._raw_delete(stale.db)
+        for kind, neighbors, scores in results:
+            for start in range(0, len(rows), batch_size // k or 1):
+                stop = start + (batch_size // k or 1)
+                SimilarRecipe.objects.bulk_create(list(_rows(
+                    recipe_ids, rows[start:stop], kind,
+                    neighbors[start:stop], scores[start:stop],
+                )))
+    return len(targets)
+
+
+def missing():
+    """ id рецептов, для которых соседи еще не считались. """
+    return Recipe.objects.filter(
+        is_archived=False, recommendations__isnull=True
+    ).values_list('id', flat=True)
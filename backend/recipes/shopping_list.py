@@ -0,0 +1,213 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import (Case, CharField, ExpressionWrapper, F,
+                              FloatField, IntegerField, Sum, Value, When)
+
+from users.models import CustomUser
+
+from .models import (IngredientInRecipe, Recipe, ShoppingCart,
+                     ShoppingListItem)
+
+# Единицы измерения из data/ingredients.csv, которые точно переводятся
+# в базовую: {единица: (базовая единица, множитель)}. Ложки, стаканы,
+# штуки и т.п. остаются как есть.
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+
+
+def recipe_amounts(recipe_id):
+    """ Количество каждого ингредиента рецепта: {ingredient_id: amount}. """
+    amounts = Counter()
+    for ingredient_id, amount in IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def apply_deltas(user_ids, deltas):
+    """
+    Прибавляет deltas ({ingredient_id: изменение}) к спискам покупок
+    пользователей. Строки пользователей блокируются, чтобы параллельные
+    изменения одного списка выполнялись по очереди.
+    """
+    user_ids = sorted(set(user_ids))
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic():
+        list(CustomUser.objects.select_for_update().filter(
+            id__in=user_ids).order_by('id').values_list('id', flat=True))
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas)
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = items.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(ShoppingListItem(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=delta,
+                        ))
+                    continue
+                item.total_amount += delta
+                if item.total_amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+        ShoppingListItem.objects.bulk_create(to_create)
+        ShoppingListItem.objects.bulk_update(to_update, ['total_amount'])
+        ShoppingListItem.objects.filter(id__in=to_delete).delete()
+
+
+def lock_recipe(recipe_id):
+    """
+    Блокирует строку рецепта до конца транзакции. Под этой блокировкой
+    меняются состав рецепта и корзины с ним, иначе рецепт, добавленный
+    в корзину во время смены состава, попал бы в список покупок дважды.
+    """
+    list(Recipe.objects.select_for_update().filter(
+        id=recipe_id).values_list('id', flat=True))
+
+
+def add_recipe(user_id, recipe_id):
+    apply_deltas([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_deltas([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def recipe_changed(recipe_id, old_amounts):
+    """ Переносит изменение состава рецепта в списки покупок всех
+    пользователей, у которых он лежит в корзине. """
+    deltas = recipe_amounts(recipe_id)
+    deltas.subtract(old_amounts)
+    apply_deltas(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True),
+        deltas,
+    )
+
+
+def aggregate(user_ids):
+    """ Список покупок, посчитанный заново по корзинам:
+    {(user_id, ingredient_id): total_amount}. """
+    return {
+        (row['user_id'], row['recipe__ingredient_in_recipe__ingredient_id']):
+        row['total_amount']
+        for row in ShoppingCart.objects.filter(
+            user_id__in=user_ids,
+            recipe__ingredient_in_recipe__isnull=False,
+        ).order_by().values(
+            'user_id', 'recipe__ingredient_in_recipe__ingredient_id'
+        ).annotate(total_amount=Sum('recipe__ingredient_in_recipe__amount'))
+    }
+
+
+def rebuild(user_ids=None, check_only=False, chunk_size=500):
+    """
+    Сверяет сохраненные списки покупок с корзинами и пересобирает
+    расходящиеся. Возвращает id пользователей с расхождениями.
+    """
+    if user_ids is None:
+        user_ids = set(ShoppingCart.objects.values_list(
+            'user_id', flat=True).distinct())
+        user_ids.update(ShoppingListItem.objects.values_list(
+            'user_id', flat=True).distinct())
+    user_ids = sorted(user_ids)
+    mismatched = []
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        with transaction.atomic():
+            list(CustomUser.objects.select_for_update().filter(
+                id__in=chunk).order_by('id').values_list('id', flat=True))
+            expected = aggregate(chunk)
+            stored = {
+                (user_id, ingredient_id): total_amount
+                for user_id, ingredient_id, total_amount
+                in ShoppingListItem.objects.filter(
+                    user_id__in=chunk
+                ).values_list('user_id', 'ingredient_id', 'total_amount')
+            }
+            broken = {
+                user_id for (user_id, _), _
+                in expected.items() ^ stored.items()
+            }
+            mismatched.extend(sorted(broken))
+            if check_only or not broken:
+                continue
+            ShoppingListItem.objects.filter(user_id__in=broken).delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount,
+                )
+                for (user_id, ingredient_id), total_amount
+                in expected.items() if user_id in broken
+            )
+    return mismatched
+
+
+def ensure_built(user_id):
+    """
+    Собирает список покупок пользователя по корзине, если он еще
+    не собран: корзины, заполненные до появления ShoppingListItem,
+    иначе давали бы пустой список до запуска rebuild_shopping_lists.
+    """
+    if ShoppingListItem.objects.filter(user_id=user_id).exists():
+        return
+    if ShoppingCart.objects.filter(
+        user_id=user_id, recipe__ingredient_in_recipe__isnull=False
+    ).exists():
+        rebuild([user_id])
+
+
+def consolidated(user_id, servings=1):
+    """
+    Список покупок, в котором единицы из UNIT_CONVERSIONS приведены
+    к базовым и одинаковые продукты объединены, с количеством,
+    умноженным на servings. Пересчет, объединение и масштабирование
+    выполняются одним GROUP BY в базе данных.
+    """
+    ensure_built(user_id)
+    unit = Case(
+        *(When(ingredient__measurement_unit=unit, then=Value(base))
+          for unit, (base, _) in UNIT_CONVERSIONS.items()),
+        default=F('ingredient__measurement_unit'),
+        output_field=CharField(),
+    )
+    factor = Case(
+        *(When(ingredient__measurement_unit=unit, then=Value(multiplier))
+          for unit, (_, multiplier) in UNIT_CONVERSIONS.items()),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    amount = Sum(F('total_amount') * factor)
+    if servings != 1:
+        amount = ExpressionWrapper(
+            amount * Value(float(servings)), output_field=FloatField())
+    return ShoppingListItem.objects.filter(user_id=user_id).values(
+        name=F('ingredient__name'), measurement_unit=unit,
+    ).annotate(amount=amount).order_by('name', 'measurement_unit')
+
+
+def format_amount(amount):
+    if float(amount).is_integer():
+        return int(amount)
+    return round(amount, 2)
@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - sha256 его содержимого:
+    recipes/ab/ab12...ef.png. Одинаковые загрузки сохраняются один раз,
+    а при смене картинки меняется и ее URL, поэтому файлы можно отдавать
+    с бессрочным кешированием. Удалять файл можно только если на него
+    не ссылается ни один рецепт (см. purge.delete_unreferenced_images).
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Обновленное время изменения защищает файл от удаления
+            # delete_unreferenced_images, пока новая ссылка на него
+            # еще не сохранена в базе.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
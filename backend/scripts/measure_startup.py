@@ -0,0 +1,143 @@
+"""
+Замер холодного старта и памяти backend для разных ролей узла.
+
+    python scripts/measure_startup.py --role all --role api
+    python scripts/measure_startup.py --gunicorn --role api
+
+Без --gunicorn для каждой роли несколько раз запускается новый процесс,
+который загружает WSGI-приложение и URLconf, и выводится медиана времени
+и RSS. С --gunicorn запускается gunicorn с gunicorn.conf.py и выводятся
+RSS, PSS и частная (не разделяемая с мастером) память каждого воркера -
+по /proc/<pid>/smaps_rollup, поэтому только на Linux.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = '''
+import json, os, resource, time
+started = time.perf_counter()
+from importlib import import_module
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+import_module(settings.ROOT_URLCONF)
+elapsed = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+try:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) // 1024
+except OSError:
+    pass
+print(json.dumps({'seconds': elapsed, 'rss': rss}))
+'''
+
+
+def environment(role):
+    env = dict(os.environ, SERVER_ROLE=role)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [str(BACKEND_DIR), env.get('PYTHONPATH')]))
+    return env
+
+
+def measure_import(role, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD], env=environment(role),
+            cwd=BACKEND_DIR, check=True, capture_output=True, text=True,
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    seconds = statistics.median(run['seconds'] for run in runs)
+    rss = statistics.median(run['rss'] for run in runs)
+    print(f'{role}: старт {seconds:.2f} с, RSS {rss:.0f} МБ')
+
+
+def memory(pid):
+    """ Rss, Pss и Private_* процесса в мегабайтах. """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    private = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return values.get('Rss', 0), values.get('Pss', 0), private
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as file:
+        return [int(child) for child in file.read().split()]
+
+
+def wait_for_port(process, port, deadline):
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def measure_gunicorn(role, port, workers, timeout):
+    env = environment(role)
+    env.update(GUNICORN_BIND=f'127.0.0.1:{port}',
+               GUNICORN_WORKERS=str(workers))
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, '-c',
+         'from gunicorn.app.wsgiapp import run; run()',
+         '--config', 'gunicorn.conf.py', 'foodgram.wsgi:application'],
+        env=env, cwd=BACKEND_DIR,
+    )
+    try:
+        if not wait_for_port(process, port, started + timeout):
+            sys.exit(f'{role}: gunicorn не запустился за {timeout} с')
+        ready = time.monotonic() - started
+        deadline = time.monotonic() + timeout
+        while (len(children(process.pid)) < workers
+               and time.monotonic() < deadline):
+            time.sleep(0.1)
+        time.sleep(1)
+        rss, pss, private = memory(process.pid)
+        print(f'{role}: готов за {ready:.2f} с; мастер RSS {rss:.0f} МБ')
+        for pid in children(process.pid):
+            rss, pss, private = memory(pid)
+            print(f'  воркер {pid}: RSS {rss:.0f} МБ, PSS {pss:.0f} МБ, '
+                  f'частная {private:.0f} МБ')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--role', action='append', choices=('all', 'api'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--timeout', type=int, default=60)
+    args = parser.parse_args()
+    for role in args.role or ('all', 'api'):
+        if args.gunicorn:
+            measure_gunicorn(role, args.port, args.workers, args.timeout)
+        else:
+            measure_import(role, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
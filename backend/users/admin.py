@@ -1,12 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from foodgram.pagination import LargeTableAdminMixin
+from recipes import purge
+
 from .models import CustomUser, Follow
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
     model = CustomUser
     list_display = ['email', 'username', 'first_name', 'last_name']
+    actions = ['purge_users']
     add_fieldsets = (
             (
                 None,
@@ -18,10 +22,18 @@ class CustomUserAdmin(UserAdmin):
             ),
         )
 
+    @admin.action(description='Удалить пачками со всеми рецептами',
+                  permissions=['delete'])
+    def purge_users(self, request, queryset):
+        count = purge.purge_users(queryset, archive=True)
+        self.message_user(request, f'Удалено пользователей: {count}')
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'author']
+    list_select_related = ['user', 'author']
+    autocomplete_fields = ['user', 'author']